@@ -1,11 +1,26 @@
 import argparse
 import json
+import os
 import shutil
 import subprocess
 import sys
-from dataclasses import dataclass
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Set
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+## Must match updater.libs.locks.LOCK_FILENAME, so deploys and submodule
+#  updates serialize on the same file in the Mothership's .git dir.
+LOCK_FILENAME = "mothership.lock"
+DEFAULT_LOCK_TIMEOUT = 300.0
+## Upstreams fetched by the last fleet deploy, next to the lock file
+PREFETCH_FILENAME = "mothership-deploy-prefetch.json"
 
 
 def parse_args() -> argparse.Namespace:
@@ -28,6 +43,46 @@ def parse_args() -> argparse.Namespace:
         help="Path to Mothership repo. Default: ~/Mothership",
     )
 
+    parser.add_argument(
+        "--lock-timeout",
+        default=DEFAULT_LOCK_TIMEOUT,
+        type=float,
+        help=f"Seconds to wait for a running submodule update to release the Mothership. Default: {DEFAULT_LOCK_TIMEOUT:.0f}",
+    )
+
+    parser.add_argument(
+        "--root",
+        dest="roots",
+        action="append",
+        default=[],
+        type=Path,
+        help="Deploy under a root filesystem (chroot/container image); '~' and absolute targets are placed inside it. '~' is the --root-home path. Repeat for a fleet deploy.",
+    )
+
+    parser.add_argument(
+        "--root-home",
+        default=None,
+        type=Path,
+        help="Home directory of the image's user inside each --root, e.g. /home/alice. Default: the home of the user running the deploy",
+    )
+
+    parser.add_argument(
+        "--home",
+        dest="homes",
+        action="append",
+        default=[],
+        type=Path,
+        help="Deploy with '~' in targets expanded to this home directory, only '~/...' targets are allowed. Repeat for a fleet deploy.",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        default=4,
+        type=int,
+        help="Number of roots/homes to deploy in parallel in fleet mode. Default: 4",
+    )
+
     return parser.parse_args()
 
 
@@ -45,6 +100,106 @@ def is_git_available() -> bool:
         return False
 
 
+def resolve_git_dir(repo_path: Path) -> Path:
+    """Return a repo's git dir, following a '.git' file (worktree/submodule).
+
+    Same rules as updater.libs.locks.resolve_git_dir, so both tools lock the same file.
+    """
+    dot_git = repo_path / ".git"
+
+    if dot_git.is_file():
+        content = dot_git.read_text().strip()
+        if content.startswith("gitdir:"):
+            git_dir = Path(content.split(":", 1)[1].strip())
+            if not git_dir.is_absolute():
+                git_dir = repo_path / git_dir
+
+            return git_dir.resolve()
+
+    return dot_git
+
+
+class MothershipLock:
+    """Advisory lock on the Mothership repo, shared with the updater.
+
+    Shared locks let several deploys read the Mothership at once, an exclusive
+    lock (used while cloning/initializing submodules or fetching upstreams for a
+    fleet deploy, and by the updater) waits for all of them. Windows only
+    supports exclusive locks.
+    """
+
+    def __init__(
+        self,
+        mothership_dir: Path,
+        timeout: Optional[float] = DEFAULT_LOCK_TIMEOUT,
+        shared: bool = False,
+    ):
+        self.lock_path = resolve_git_dir(mothership_dir.absolute()) / LOCK_FILENAME
+        self.timeout = timeout
+        self.shared = shared
+        ## Set on enter, True if another update/deploy held the lock first
+        self.contended = False
+        self._fd: Optional[int] = None
+
+    def _try_lock(self, fd: int) -> bool:
+        if os.name == "nt":
+            try:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                return False
+
+        flags = (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+            return True
+        except BlockingIOError:
+            return False
+
+    def __enter__(self) -> "MothershipLock":
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        start = time.monotonic()
+        self.contended = False
+
+        while not self._try_lock(fd):
+            elapsed = time.monotonic() - start
+
+            if not self.contended:
+                self.contended = True
+                print(
+                    "Mothership is locked by another update/deploy, waiting"
+                    + (f" up to {self.timeout:.0f}s" if self.timeout is not None else "")
+                )
+
+            if self.timeout is not None and elapsed >= self.timeout:
+                os.close(fd)
+                raise TimeoutError(
+                    f"Timed out after {elapsed:.1f}s waiting for lock {self.lock_path}"
+                )
+
+            time.sleep(0.1)
+
+        if self.contended:
+            print(f"✓ Acquired Mothership lock after {time.monotonic() - start:.1f}s")
+
+        self._fd = fd
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._fd is None:
+            return
+
+        try:
+            if os.name == "nt":
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
 @dataclass
 class RepositoryConfig:
     """Container for git repositories loaded from JSON."""
@@ -101,13 +256,86 @@ class DeployedRepo:
     remote_url: str
 
 
+@dataclass
+class DeployRoot:
+    """A root filesystem or home directory to deploy into in fleet mode."""
+
+    path: Path
+    is_home: bool = False
+    ## Home directory inside a root filesystem, '~' in targets maps to it
+    home: Optional[Path] = None
+
+    def resolve(self, target: str) -> Path:
+        """Map a deploy.json target path into this root.
+
+        Raises ValueError for targets that would land outside the root, including
+        through a symlink inside the root that points out of it.
+        """
+        if target == "~" or target.startswith("~/"):
+            relative = Path(target[2:])
+            if self.is_home:
+                resolved = self.path / relative
+            else:
+                home = self.home if self.home is not None else Path.home()
+                resolved = self.path / home.relative_to(home.anchor) / relative
+
+        elif self.is_home:
+            raise ValueError(
+                f"target '{target}' is not under '~', can't deploy it into home {self.path}"
+            )
+
+        elif Path(target).is_absolute():
+            ## Root filesystem: re-root absolute paths inside it
+            resolved = self.path / Path(target).relative_to(Path(target).anchor)
+
+        else:
+            raise ValueError(
+                f"target '{target}' must be absolute or start with '~' to deploy into root {self.path}"
+            )
+
+        resolved = Path(os.path.normpath(resolved))
+        if resolved != self.path and self.path not in resolved.parents:
+            raise ValueError(f"target '{target}' resolves outside of {self.path}")
+
+        ## The target doesn't exist yet, follow symlinks in the part that does
+        existing = resolved
+        while existing != self.path and not (existing.exists() or existing.is_symlink()):
+            existing = existing.parent
+
+        real_root = self.path.resolve()
+        real_existing = existing.resolve()
+        if real_existing != real_root and real_root not in real_existing.parents:
+            raise ValueError(
+                f"target '{target}' leaves {self.path} through a symlink at {existing}"
+            )
+
+        return resolved
+
+
+@dataclass
+class RootReport:
+    """Deployment results for one root in fleet mode."""
+
+    root: DeployRoot
+    deployed_repos: List[DeployedRepo] = field(default_factory=list)
+    failed_repos: List[str] = field(default_factory=list)
+    skipped_repos: List[str] = field(default_factory=list)
+
+
 class MothershipController:
     """End-to-end Mothership deployment controller."""
 
-    def __init__(self, mothership_dir: Path, config_path: Path, script_cwd: Path):
+    def __init__(
+        self,
+        mothership_dir: Path,
+        config_path: Path,
+        script_cwd: Path,
+        lock_timeout: Optional[float] = DEFAULT_LOCK_TIMEOUT,
+    ):
         self.mothership_dir = mothership_dir.absolute()
         self.config_path = config_path.absolute()
         self.script_cwd = script_cwd.absolute()
+        self.lock_timeout = lock_timeout
 
         self._ensure_mothership()
 
@@ -116,6 +344,10 @@ class MothershipController:
         self.deployed_repos: List[DeployedRepo] = []
         self.failed_repos: List[str] = []
         self.skipped_repos: List[str] = []
+        ## Submodule name -> upstream remote, filled once before a fleet deploy
+        self.submodule_remotes: Dict[str, str] = {}
+        ## Submodules whose upstream was fetched into the Mothership this run
+        self.prefetched_submodules: Set[str] = set()
 
     def _ensure_mothership(self) -> None:
         """Clone Mothership repo if it doesn't exist, using config URL."""
@@ -153,11 +385,12 @@ class MothershipController:
             print(f"✓ Mothership cloned to {self.mothership_dir}")
 
             print("Initializing and updating submodules")
-            subprocess.run(
-                ["git", "submodule", "update", "--init", "--recursive"],
-                cwd=self.mothership_dir,
-                check=True,
-            )
+            with MothershipLock(self.mothership_dir, timeout=self.lock_timeout):
+                subprocess.run(
+                    ["git", "submodule", "update", "--init", "--recursive"],
+                    cwd=self.mothership_dir,
+                    check=True,
+                )
             print("✓ Submodules initialized")
 
         except subprocess.CalledProcessError as e:
@@ -236,41 +469,128 @@ class MothershipController:
 
         raise ValueError(f"No remote found for submodule '{name}'")
 
-    def deploy_repo(self, repo: RepositoryConfig) -> None:
-        """Deploy single repository from the Mothership."""
-        target = Path(repo.target).expanduser()
+    def resolve_submodule_remotes(self) -> None:
+        """Look up every deployed submodule's remote once, instead of once per root."""
+        for repo in self.deploy_order:
+            if repo.mothership_remote or repo.name in self.submodule_remotes:
+                continue
+
+            if not (self.mothership_dir / "modules" / repo.name).exists():
+                continue
+
+            try:
+                self.submodule_remotes[repo.name] = self.get_submodule_remote(repo.name)
+            except ValueError:
+                ## deploy_repo() retries and records the failure per root
+                pass
+
+    def _read_prefetch_record(self, path: Path) -> Optional[dict]:
+        try:
+            record = json.loads(path.read_text())
+
+            return {
+                "finished_at": float(record["finished_at"]),
+                "submodules": set(record["submodules"]),
+            }
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_prefetch_record(self, path: Path, submodules: Set[str]) -> None:
+        record = {"finished_at": time.time(), "submodules": sorted(submodules)}
+
+        ## Write then rename, a concurrent deploy never reads a partial file
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(record))
+        os.replace(tmp_path, path)
+
+    def prefetch_submodules(self, reuse_after: Optional[float] = None) -> None:
+        """Fetch each deployed submodule's upstream into the Mothership once.
+
+        Fleet deploys then update every root from these refs locally, instead
+        of each root pulling from the upstream itself. Call with the Mothership
+        locked exclusively. With `reuse_after`, upstreams that a concurrent
+        fleet deploy fetched after that time are not fetched again.
+        """
+        record_path = resolve_git_dir(self.mothership_dir) / PREFETCH_FILENAME
+        reused: Set[str] = set()
+
+        if reuse_after is not None:
+            previous = self._read_prefetch_record(record_path)
+            if previous is not None and previous["finished_at"] >= reuse_after:
+                reused = previous["submodules"]
+
+        for repo in self.deploy_order:
+            src = self.mothership_dir / "modules" / repo.name
+            if repo.mothership_remote or not src.exists():
+                continue
+
+            if repo.name in reused:
+                print(f"✓ {repo.name} upstream was just fetched by another deploy")
+                self.prefetched_submodules.add(repo.name)
+                continue
+
+            print(f"Fetching {repo.name} upstream")
+            try:
+                subprocess.run(
+                    ["git", "fetch", "--quiet", "origin"], cwd=src, check=True
+                )
+                self.prefetched_submodules.add(repo.name)
+            except subprocess.CalledProcessError:
+                print(
+                    f"  [WARN] Could not fetch {repo.name}, roots get the Mothership's copy"
+                )
+
+        self._write_prefetch_record(record_path, self.prefetched_submodules)
+
+    def deploy_repo(
+        self,
+        repo: RepositoryConfig,
+        target: Optional[Path] = None,
+        report: Optional["RootReport"] = None,
+        prefix: str = "",
+    ) -> None:
+        """Deploy single repository from the Mothership.
+
+        `target` overrides the repo's configured target, results are recorded on
+        `report` (this controller by default). `prefix` tags output lines when
+        several roots are deployed in parallel. Repos fetched by
+        prefetch_submodules() are updated from the Mothership, not the upstream.
+        """
+        target = target if target is not None else Path(repo.target).expanduser()
+        report = report if report is not None else self
         src: Path = self.mothership_dir / "modules" / repo.name
 
         if not src.exists():
-            self.failed_repos.append(f"{repo.name}: Submodule not found at {src}")
-            print(f"  [ERROR] Submodule {src} not found")
+            report.failed_repos.append(f"{repo.name}: Submodule not found at {src}")
+            print(f"{prefix}  [ERROR] Submodule {src} not found")
             return
 
-        print(f"Deploying {repo.name} → {target}")
+        print(f"{prefix}Deploying {repo.name} → {target}")
 
         if target.exists():
             if target.is_dir() and (target / ".git").exists():
-                self.skipped_repos.append(f"{repo.name} (existing git repo)")
+                report.skipped_repos.append(f"{repo.name} (existing git repo)")
                 print(
-                    f"  Skipping, target '{target}' already exists and is a git repository"
+                    f"{prefix}  Skipping, target '{target}' already exists and is a git repository"
                 )
                 return
 
             else:
-                self.skipped_repos.append(f"{repo.name} (existing non-git)")
+                report.skipped_repos.append(f"{repo.name} (existing non-git)")
                 print(
-                    f"  Skipping, target '{target}' already exists but is not a git repository"
+                    f"{prefix}  Skipping, target '{target}' already exists but is not a git repository"
                 )
                 return
 
         remote_url = ""
         try:
             target.parent.mkdir(parents=True, exist_ok=True)
+            ## Local clones hardlink objects from the Mothership where possible
             subprocess.run(["git", "clone", str(src), str(target)], check=True)
 
             if repo.mothership_remote:
                 remote_url = str(src)
-                print(f"  Remote: MOTHERSHIP {remote_url}")
+                print(f"{prefix}  Remote: MOTHERSHIP {remote_url}")
                 subprocess.run(
                     ["git", "remote", "set-url", "origin", remote_url],
                     cwd=target,
@@ -278,14 +598,31 @@ class MothershipController:
                 )
 
             else:
-                remote_url = self.get_submodule_remote(repo.name)
-                print(f"  Remote: {remote_url}")
+                remote_url = self.submodule_remotes.get(
+                    repo.name
+                ) or self.get_submodule_remote(repo.name)
+                print(f"{prefix}  Remote: {remote_url}")
                 subprocess.run(
                     ["git", "remote", "set-url", "origin", remote_url],
                     cwd=target,
                     check=True,
                 )
 
+            from_mothership = repo.name in self.prefetched_submodules
+            if from_mothership:
+                ## Take the upstream's branches from the Mothership's fetch
+                subprocess.run(
+                    [
+                        "git",
+                        "fetch",
+                        "--quiet",
+                        str(src),
+                        "+refs/remotes/origin/*:refs/remotes/origin/*",
+                    ],
+                    cwd=target,
+                    check=True,
+                )
+
             subprocess.run(
                 ["git", "stash", "push", "-m", "Auto-stash before mothership deploy"],
                 cwd=target,
@@ -311,12 +648,19 @@ class MothershipController:
                     cwd=target,
                 )
 
-                subprocess.run(["git", "pull", "--ff-only"], cwd=target, check=True)
+                if from_mothership:
+                    subprocess.run(
+                        ["git", "merge", "--ff-only", f"origin/{repo.branch}"],
+                        cwd=target,
+                        check=True,
+                    )
+                else:
+                    subprocess.run(["git", "pull", "--ff-only"], cwd=target, check=True)
 
             except subprocess.CalledProcessError:
-                print(f"  Note: Could not set upstream/pull")
+                print(f"{prefix}  Note: Could not set upstream/pull")
 
-            self.deployed_repos.append(
+            report.deployed_repos.append(
                 DeployedRepo(
                     name=repo.name,
                     target=str(target),
@@ -324,11 +668,11 @@ class MothershipController:
                     remote_url=remote_url,
                 )
             )
-            print(f"  ✓ {repo.name} deployed")
+            print(f"{prefix}  ✓ {repo.name} deployed")
 
         except Exception as e:
-            self.failed_repos.append(f"{repo.name}: {str(e)[:100]}")
-            print(f"  [ERROR] Failed to deploy {repo.name}: {e}")
+            report.failed_repos.append(f"{repo.name}: {str(e)[:100]}")
+            print(f"{prefix}  [ERROR] Failed to deploy {repo.name}: {e}")
 
     def print_deploy_order(self) -> None:
         print("Deploy order:")
@@ -375,13 +719,122 @@ class MothershipController:
     def deploy_all(self) -> None:
         self.print_deploy_order()
 
-        for repo in self.deploy_order:
-            self.deploy_repo(repo)
-            print()
+        ## Hold a shared lock so a submodule update can't rewrite the
+        #  Mothership while repos are being cloned out of it
+        with MothershipLock(self.mothership_dir, timeout=self.lock_timeout, shared=True):
+            for repo in self.deploy_order:
+                self.deploy_repo(repo)
+                print()
 
         print("\nDeploy complete")
         self.display_report()
 
+    def _deploy_root(self, report: RootReport) -> None:
+        prefix = f"[{report.root.path}] "
+
+        for repo in self.deploy_order:
+            self.deploy_repo(
+                repo,
+                target=report.root.resolve(repo.target),
+                report=report,
+                prefix=prefix,
+            )
+
+    def _check_roots(self, roots: List[DeployRoot]) -> List[DeployRoot]:
+        """Drop duplicate roots, reject nested roots and targets outside a root."""
+        unique: List[DeployRoot] = []
+        for root in roots:
+            root.path = root.path.expanduser().resolve()
+
+            if any(other.path == root.path for other in unique):
+                print(f"[WARN] {root.path} given more than once, deploying to it once")
+                continue
+
+            for other in unique:
+                if root.path in other.path.parents or other.path in root.path.parents:
+                    raise ValueError(f"Roots can't be nested: {other.path}, {root.path}")
+
+            unique.append(root)
+
+        errors = []
+        for root in unique:
+            for repo in self.deploy_order:
+                try:
+                    root.resolve(repo.target)
+                except ValueError as exc:
+                    errors.append(f"{repo.name}: {exc}")
+
+        if errors:
+            raise ValueError("Invalid fleet targets:\n  " + "\n  ".join(errors))
+
+        return unique
+
+    def deploy_fleet(self, roots: List[DeployRoot], jobs: int = 4) -> List[RootReport]:
+        """Deploy the plan into every root, `jobs` roots at a time."""
+        roots = self._check_roots(roots)
+        self.print_deploy_order()
+
+        reports = [RootReport(root=root) for root in roots]
+        jobs = max(1, min(jobs, len(reports)))
+        print(f"Deploying to {len(reports)} root(s), {jobs} at a time\n")
+
+        ## Fetching writes the Mothership's refs, so it takes the lock exclusively.
+        #  Deploys that queued behind another one's fetch reuse it.
+        requested_at = time.time()
+        with MothershipLock(self.mothership_dir, timeout=self.lock_timeout) as lock:
+            self.resolve_submodule_remotes()
+            self.prefetch_submodules(reuse_after=requested_at if lock.contended else None)
+            print()
+
+        with MothershipLock(self.mothership_dir, timeout=self.lock_timeout, shared=True):
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                ## list() re-raises any unexpected error from a worker
+                list(executor.map(self._deploy_root, reports))
+
+        print("\nFleet deploy complete")
+        self.display_fleet_report(reports)
+
+        return reports
+
+    def display_fleet_report(self, reports: List[RootReport]) -> None:
+        print("\n" + "=" * 80)
+        print("FLEET DEPLOYMENT REPORT")
+        print("=" * 80)
+        print(f"{'Root':<50} {'Deployed':>9} {'Skipped':>8} {'Failed':>7}")
+        print("-" * 80)
+
+        for report in reports:
+            print(
+                f"{str(report.root.path):<50} {len(report.deployed_repos):>9} "
+                f"{len(report.skipped_repos):>8} {len(report.failed_repos):>7}"
+            )
+
+        print("-" * 80)
+        print(
+            f"{'Total':<50} {sum(len(r.deployed_repos) for r in reports):>9} "
+            f"{sum(len(r.skipped_repos) for r in reports):>8} "
+            f"{sum(len(r.failed_repos) for r in reports):>7}"
+        )
+        print()
+
+        for report in reports:
+            if not (report.deployed_repos or report.skipped_repos or report.failed_repos):
+                continue
+
+            print(f"{report.root.path}:")
+            for repo in report.deployed_repos:
+                print(f"  ✓ {repo.name:<20} {repo.target:<35} {repo.branch}")
+
+            for reason in report.skipped_repos:
+                print(f"  - SKIPPED {reason}")
+
+            for reason in report.failed_repos:
+                print(f"  ✗ FAILED {reason}")
+
+            print()
+
+        print("=" * 80)
+
 
 if __name__ == "__main__":
     if not is_git_available():
@@ -400,8 +853,22 @@ if __name__ == "__main__":
     mothership_dir = args.mothership.absolute()
 
     try:
-        controller = MothershipController(mothership_dir, config_path, script_cwd)
-        controller.deploy_all()
+        controller = MothershipController(
+            mothership_dir, config_path, script_cwd, lock_timeout=args.lock_timeout
+        )
+        roots = [
+            DeployRoot(path=root.expanduser().absolute(), home=args.root_home)
+            for root in args.roots
+        ]
+        roots += [
+            DeployRoot(path=home.expanduser().absolute(), is_home=True)
+            for home in args.homes
+        ]
+
+        if roots:
+            controller.deploy_fleet(roots, jobs=args.jobs)
+        else:
+            controller.deploy_all()
     except Exception as exc:
         print(f"[ERROR] ({type(exc).__name__}) Failed to deploy repositories: {exc}")
         sys.exit(1)
@@ -1,10 +1,13 @@
 import logging
 import argparse
+import os
 
 log = logging.getLogger(__name__)
 
 from updater.main import ShellCommandRunner
 from updater.libs.setup import setup_package_logging
+from updater.libs.locks import DEFAULT_LOCK_TIMEOUT
+from updater.services.mirror_svc import DEFAULT_MIRROR_CACHE_DIR, DEFAULT_MIRROR_TTL, MirrorCache
 from updater.commands import git_cmd
 
 
@@ -14,6 +17,11 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--debug", "-d", action="store_true", help="Enable debug logging")
     parser.add_argument("--log-file", "-l", type=str, help="Set path to logging file", default="logs/mothership_repo_updater.log")
     parser.add_argument("--update-submodules", "-u", action="store_true", help="Update all submodules")
+    parser.add_argument("--lock-timeout", type=float, help="Seconds to wait for another update/deploy holding the repository lock", default=DEFAULT_LOCK_TIMEOUT)
+    parser.add_argument("--mirror-cache", "-m", type=str, nargs="?", const=str(DEFAULT_MIRROR_CACHE_DIR), help=f"Fetch submodules through a shared cache of bare mirrors (default dir: {DEFAULT_MIRROR_CACHE_DIR}). Also enabled by $MOTHERSHIP_MIRROR_CACHE", default=os.environ.get("MOTHERSHIP_MIRROR_CACHE"))
+    parser.add_argument("--mirror-ttl", type=float, help="Seconds before a cached mirror is fetched from its upstream again", default=DEFAULT_MIRROR_TTL)
+    parser.add_argument("--mirror-report", action="store_true", help="Print mirror cache size report")
+    parser.add_argument("--mirror-prune", type=float, metavar="DAYS", help="Delete cached mirrors not fetched in DAYS days")
     
     args = parser.parse_args()
 
@@ -29,10 +37,30 @@ if __name__ == "__main__":
     setup_package_logging(log_level=log_level, log_file=log_file)
     log.debug("DEBUG logging enabled")
     
+    mirror_cache = MirrorCache(
+        cache_dir=args.mirror_cache or DEFAULT_MIRROR_CACHE_DIR,
+        ttl=args.mirror_ttl,
+        lock_timeout=args.lock_timeout,
+    )
+
+    if args.mirror_prune is not None or args.mirror_report:
+        if args.mirror_prune is not None:
+            pruned = mirror_cache.prune(args.mirror_prune * 24 * 60 * 60)
+            log.info(f"Pruned {len(pruned)} mirror(s)")
+
+        if args.mirror_report:
+            print(mirror_cache.report())
+
+        if not args.update_submodules:
+            exit(0)
+
     if args.update_submodules:
         ## Pull & update all submodules
         try:
-            submodule_update_success = git_cmd.prefab.update_git_submodules()
+            submodule_update_success = git_cmd.prefab.update_git_submodules(
+                lock_timeout=args.lock_timeout,
+                mirror_cache=mirror_cache if args.mirror_cache else None,
+            )
         except Exception as exc:
             log.error("Failed updating submodules.", exc)
             exit(1)
@@ -1,6 +1,16 @@
+from __future__ import annotations
+
 import logging
+from pathlib import Path
 
+from updater.libs.locks import (
+    DEFAULT_LOCK_TIMEOUT,
+    RepoLockTimeout,
+    resolve_repo_root,
+    single_flight,
+)
 from updater.main import ShellCommandRunner
+from updater.services.mirror_svc import MirrorCache
 
 log = logging.getLogger(__name__)
 
@@ -8,16 +18,56 @@ log = logging.getLogger(__name__)
 __all__ = ["update_git_submodules"]
 
 
-def update_git_submodules(runner: ShellCommandRunner | None  = None):
+def update_git_submodules(
+    runner: ShellCommandRunner | None  = None,
+    repo_path: str | Path | None = None,
+    lock_timeout: float | None = DEFAULT_LOCK_TIMEOUT,
+    mirror_cache: MirrorCache | None = None,
+):
     if runner is None:
         runner: ShellCommandRunner = ShellCommandRunner()
-    
-    ## Pull submodule changes
-    submodule_pull_cmd = ["git", "pull", "--recurse-submodules"]
+
+    ## Serialize with other updater/deploy runs on this repo. If an update is
+    #  already in progress, wait for it and reuse its result.
+    try:
+        ## Lock the top level repo, the updater may be run from a subdirectory
+        repo_path = resolve_repo_root(repo_path or Path.cwd())
+        result = single_flight(
+            repo_path,
+            "update-submodules",
+            lambda: _pull_and_update_submodules(
+                runner, cwd=str(repo_path), mirror_cache=mirror_cache
+            ),
+            timeout=lock_timeout,
+        )
+    except (RepoLockTimeout, FileNotFoundError) as e:
+        log.error(f"Failed updating submodules: {e}")
+        return False
+
+    if result.reused and result.success:
+        log.info("Submodules were updated by a concurrent run, skipped duplicate update")
+    elif result.reused:
+        log.error("A concurrent submodule update failed, not retrying in this run")
+
+    return result.success
+
+
+def _pull_and_update_submodules(
+    runner: ShellCommandRunner,
+    cwd: str | None = None,
+    mirror_cache: MirrorCache | None = None,
+):
+    ## Pull submodule changes. With a mirror cache, submodules are fetched from
+    #  it below instead of by the pull.
+    submodule_pull_cmd = [
+        "git",
+        "pull",
+        "--recurse-submodules" if mirror_cache is None else "--no-recurse-submodules",
+    ]
     
     log.info("Recursively updating all submodules.")
     try:
-        submodule_pull_exit_code = runner.run(submodule_pull_cmd)
+        submodule_pull_exit_code = runner.run(submodule_pull_cmd, cwd=cwd)
         log.info("Updated submodules")
     except Exception as e:
         log.error(f"Failed updating submodules: {e}")
@@ -29,18 +79,38 @@ def update_git_submodules(runner: ShellCommandRunner | None  = None):
         return False
         
     ## Update submodules
-    submodule_update_cmd = ["git", "submodule", "update", "--init", "--recursive", "--remote"]
-    
-    try:
-        submodule_update_exit_code = runner.run(submodule_update_cmd)
-        log.info("Updated submodules")
-    except Exception as e:
-        log.error(f"Failed updating submodules: {e}")
-        return False
-    
-    if submodule_update_exit_code != 0:
-        log.warning(f"Failed executing command: {','.join(submodule_update_cmd)}")
+    if mirror_cache is None:
+        submodule_update_cmds = [
+            ["git", "submodule", "update", "--init", "--recursive", "--remote"]
+        ]
+    else:
+        ## Fetch top level submodules from the mirror cache, then update them
+        #  without fetching again. Nested submodules still use their remotes.
+        repo_path = cwd or Path.cwd()
+        mirrors = mirror_cache.refresh_all(repo_path)
+        log.info(f"Fetching {len(mirrors)} submodule(s) from mirror cache {mirror_cache.cache_dir}")
+
+        if not mirror_cache.fetch_submodules(repo_path, mirrors):
+            log.warning("Failed fetching submodules")
+
+            return False
+
+        submodule_update_cmds = [
+            ["git", "submodule", "update", "--init", "--remote", "--no-fetch"],
+            ["git", "submodule", "foreach", "--quiet", "git submodule update --init --recursive --remote"],
+        ]
+
+    for submodule_update_cmd in submodule_update_cmds:
+        try:
+            submodule_update_exit_code = runner.run(submodule_update_cmd, cwd=cwd)
+            log.info("Updated submodules")
+        except Exception as e:
+            log.error(f"Failed updating submodules: {e}")
+            return False
         
-        return False
+        if submodule_update_exit_code != 0:
+            log.warning(f"Failed executing command: {','.join(submodule_update_cmd)}")
+            
+            return False
         
     return True
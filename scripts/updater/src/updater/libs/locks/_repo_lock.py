@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+import json
+import logging
+import os
+from pathlib import Path
+import subprocess
+import time
+from typing import Callable, Optional
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+log = logging.getLogger(__name__)
+
+__all__ = [
+    "DEFAULT_LOCK_TIMEOUT",
+    "RepoLock",
+    "RepoLockTimeout",
+    "SingleFlightResult",
+    "read_single_flight_result",
+    "resolve_git_dir",
+    "resolve_repo_root",
+    "single_flight",
+]
+
+## Lock file name inside a repository's git dir. The deploy script
+#  (scripts/deploy/do_deployment.py) uses the same file, keep them in sync.
+LOCK_FILENAME = "mothership.lock"
+## Last result of a single-flight operation, stored next to the lock file
+RESULT_FILENAME = "mothership-{operation}.json"
+
+DEFAULT_LOCK_TIMEOUT = 300.0
+POLL_INTERVAL = 0.1
+
+
+class RepoLockTimeout(TimeoutError):
+    """Raised when a repository lock could not be acquired in time."""
+
+
+def resolve_git_dir(repo_path: str | Path) -> Path:
+    """Return the git dir for a worktree, submodule checkout or bare repository."""
+    repo_path = Path(repo_path).absolute()
+    dot_git = repo_path / ".git"
+
+    if dot_git.is_dir():
+        return dot_git
+
+    if dot_git.is_file():
+        ## Submodules & worktrees use a '.git' file pointing at the real git dir
+        content = dot_git.read_text().strip()
+        if content.startswith("gitdir:"):
+            git_dir = Path(content.split(":", 1)[1].strip())
+            if not git_dir.is_absolute():
+                git_dir = repo_path / git_dir
+
+            return git_dir.resolve()
+
+    if (repo_path / "HEAD").is_file() and (repo_path / "objects").is_dir():
+        ## Bare repository
+        return repo_path
+
+    raise FileNotFoundError(f"Not a git repository: {repo_path}")
+
+
+def resolve_repo_root(path: str | Path) -> Path:
+    """Return the top level of the worktree containing `path` (any subdirectory)."""
+    result = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"],
+        cwd=path,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0 or not result.stdout.strip():
+        raise FileNotFoundError(f"Not inside a git repository: {path}")
+
+    return Path(result.stdout.strip())
+
+
+def _try_lock(fd: int, shared: bool) -> bool:
+    if os.name == "nt":
+        ## msvcrt has no shared locks, every lock is exclusive on Windows
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB
+    try:
+        fcntl.flock(fd, flags)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _unlock(fd: int) -> None:
+    if os.name == "nt":
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class RepoLock:
+    """Advisory, cross-process lock on a git repository.
+
+    The lock is a file in the repository's git dir, so the updater, the deploy
+    script and scheduled jobs all serialize on the same path. Waiting is bounded
+    by `timeout` (None waits forever) and raises RepoLockTimeout when exceeded.
+    """
+
+    def __init__(
+        self,
+        repo_path: str | Path,
+        timeout: Optional[float] = DEFAULT_LOCK_TIMEOUT,
+        shared: bool = False,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.repo_path = Path(repo_path).absolute()
+        self.lock_path = resolve_git_dir(self.repo_path) / LOCK_FILENAME
+        self.timeout = timeout
+        self.shared = shared
+        self.poll_interval = poll_interval
+
+        ## Set on acquire, so callers can report how long they were blocked
+        self.contended: bool = False
+        self.waited: float = 0.0
+
+        self._fd: Optional[int] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> "RepoLock":
+        if self._fd is not None:
+            raise RuntimeError(f"Lock on {self.repo_path} is already held")
+
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        start = time.monotonic()
+        self.contended = False
+
+        while not _try_lock(fd, self.shared):
+            elapsed = time.monotonic() - start
+
+            if not self.contended:
+                self.contended = True
+                log.info(
+                    f"Repository {self.repo_path} is locked by another process, waiting"
+                    + (f" up to {self.timeout:.0f}s" if self.timeout is not None else "")
+                )
+
+            if self.timeout is not None and elapsed >= self.timeout:
+                os.close(fd)
+                raise RepoLockTimeout(
+                    f"Timed out after {elapsed:.1f}s waiting for lock {self.lock_path}"
+                )
+
+            time.sleep(self.poll_interval)
+
+        self.waited = time.monotonic() - start
+        self._fd = fd
+
+        if self.contended:
+            log.info(f"Acquired lock on {self.repo_path} after waiting {self.waited:.1f}s")
+        else:
+            log.debug(f"Acquired lock on {self.repo_path}")
+
+        return self
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+
+        try:
+            _unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+        log.debug(f"Released lock on {self.repo_path}")
+
+    def __enter__(self) -> "RepoLock":
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.release()
+
+
+@dataclass
+class SingleFlightResult:
+    """Outcome of an operation run through single_flight()."""
+
+    success: bool
+    started_at: float
+    finished_at: float
+    ## True when the result came from another invocation's run
+    reused: bool = False
+    lock_wait: float = 0.0
+
+
+def _read_result(path: Path) -> Optional[SingleFlightResult]:
+    try:
+        data = json.loads(path.read_text())
+
+        return SingleFlightResult(
+            success=bool(data["success"]),
+            started_at=float(data["started_at"]),
+            finished_at=float(data["finished_at"]),
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def read_single_flight_result(
+    repo_path: str | Path, operation: str
+) -> Optional[SingleFlightResult]:
+    """Return the last recorded result of `operation` in a repository, if any."""
+    git_dir = resolve_git_dir(repo_path)
+
+    return _read_result(git_dir / RESULT_FILENAME.format(operation=operation))
+
+
+def _write_result(path: Path, result: SingleFlightResult) -> None:
+    data = asdict(result)
+    data.pop("reused")
+    data.pop("lock_wait")
+
+    ## Write then rename, a reader never sees a partial file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def single_flight(
+    repo_path: str | Path,
+    operation: str,
+    func: Callable[[], bool],
+    timeout: Optional[float] = DEFAULT_LOCK_TIMEOUT,
+    max_age: Optional[float] = None,
+) -> SingleFlightResult:
+    """Run `func` under the repository lock, coalescing concurrent callers.
+
+    If another invocation was already running `operation` when this one was
+    requested, wait for it and return its result instead of running `func` again.
+    A caller that arrives after a run has finished runs `func` itself, unless
+    `max_age` is set and the last successful run finished less than `max_age`
+    seconds ago.
+    """
+    requested_at = time.time()
+
+    with RepoLock(repo_path, timeout=timeout) as lock:
+        result_path = lock.lock_path.with_name(RESULT_FILENAME.format(operation=operation))
+        previous = _read_result(result_path)
+
+        if previous is not None and lock.contended and previous.finished_at >= requested_at:
+            log.info(
+                f"Reusing '{operation}' result from a concurrent run in {lock.repo_path} "
+                f"(success={previous.success}, waited {lock.waited:.1f}s)"
+            )
+            previous.reused = True
+            previous.lock_wait = lock.waited
+
+            return previous
+
+        if (
+            previous is not None
+            and max_age is not None
+            and previous.success
+            and time.time() - previous.finished_at < max_age
+        ):
+            log.debug(
+                f"Reusing '{operation}' result in {lock.repo_path}, "
+                f"last run finished {time.time() - previous.finished_at:.0f}s ago"
+            )
+            previous.reused = True
+            previous.lock_wait = lock.waited
+
+            return previous
+
+        started_at = time.time()
+        success = bool(func())
+        result = SingleFlightResult(
+            success=success,
+            started_at=started_at,
+            finished_at=time.time(),
+            lock_wait=lock.waited,
+        )
+        _write_result(result_path, result)
+
+        return result
@@ -2,6 +2,8 @@ import logging
 
 from updater.services.shell_svc import ShellCommandRunner
 from updater.libs.setup import setup_package_logging
+from updater.libs.locks import DEFAULT_LOCK_TIMEOUT
+from updater.services.mirror_svc import DEFAULT_MIRROR_TTL, MirrorCache
 from updater.commands import git_cmd
 
 log = logging.getLogger(__name__)
@@ -14,6 +16,9 @@ def run_updater(
     debug: bool = False,
     log_file: str = "logs/mothership_repo_updater.log",
     update_submodules: bool = False,
+    lock_timeout: float | None = DEFAULT_LOCK_TIMEOUT,
+    mirror_cache_dir: str | None = None,
+    mirror_ttl: float = DEFAULT_MIRROR_TTL,
 ):
     log_level = "DEBUG" if debug else "INFO"
     setup_package_logging(log_level=log_level, log_file=log_file)
@@ -22,8 +27,15 @@ def run_updater(
     log.debug("DEBUG logging enabled")
 
     if update_submodules:
+        mirror_cache = (
+            MirrorCache(mirror_cache_dir, ttl=mirror_ttl, lock_timeout=lock_timeout)
+            if mirror_cache_dir
+            else None
+        )
         try:
-            submodule_update_success = git_cmd.prefab.update_git_submodules()
+            submodule_update_success = git_cmd.prefab.update_git_submodules(
+                lock_timeout=lock_timeout, mirror_cache=mirror_cache
+            )
         except Exception as exc:
             log.error("Failed updating submodules.", exc_info=exc)
             return 1
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import hashlib
+import logging
+import os
+from pathlib import Path
+import re
+import shutil
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+from updater.libs.locks import (
+    DEFAULT_LOCK_TIMEOUT,
+    RepoLock,
+    RepoLockTimeout,
+    single_flight,
+)
+
+log = logging.getLogger(__name__)
+
+__all__ = [
+    "DEFAULT_MIRROR_CACHE_DIR",
+    "DEFAULT_MIRROR_TTL",
+    "MirrorCache",
+    "MirrorInfo",
+    "read_gitmodules_paths",
+    "read_gitmodules_urls",
+]
+
+DEFAULT_MIRROR_CACHE_DIR = Path(
+    os.environ.get(
+        "MOTHERSHIP_MIRROR_CACHE",
+        Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+        / "mothership"
+        / "mirrors",
+    )
+)
+DEFAULT_MIRROR_TTL = 15 * 60
+
+## single_flight() operation name for mirror fetches, its result file records
+#  the last fetch attempt and drives the TTL
+FETCH_OPERATION = "mirror-fetch"
+## Touched in the mirror's git dir after each successful fetch, its mtime is
+#  the 'last fetched' time used for reporting and pruning
+FETCHED_MARKER = "mothership-mirror-fetched"
+
+
+def _read_gitmodules(repo_path: str | Path, key: str) -> Dict[str, str]:
+    repo_path = Path(repo_path)
+    if not (repo_path / ".gitmodules").exists():
+        return {}
+
+    result = subprocess.run(
+        ["git", "config", "-f", ".gitmodules", "--get-regexp", rf"^submodule\..*\.{key}$"],
+        cwd=repo_path,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        log.warning(f"Could not read .gitmodules in {repo_path}: {result.stderr.strip()}")
+        return {}
+
+    values = {}
+    for line in result.stdout.splitlines():
+        full_key, _, value = line.partition(" ")
+        name = full_key[len("submodule.") : -len(f".{key}")]
+        values[name] = value.strip()
+
+    return values
+
+
+def read_gitmodules_urls(repo_path: str | Path) -> Dict[str, str]:
+    """Return {submodule name: url} from a repository's .gitmodules file."""
+    return _read_gitmodules(repo_path, "url")
+
+
+def read_gitmodules_paths(repo_path: str | Path) -> Dict[str, str]:
+    """Return {submodule name: path} from a repository's .gitmodules file."""
+    return _read_gitmodules(repo_path, "path")
+
+
+@dataclass
+class MirrorInfo:
+    url: str
+    path: Path
+    size_bytes: int
+    last_fetched: Optional[float]
+
+
+class MirrorCache:
+    """Shared cache of bare mirrors for submodule upstreams.
+
+    Each upstream URL gets one `git clone --mirror` style repository in
+    `cache_dir`, fetched incrementally at most once per `ttl` seconds no matter
+    how many Mothership checkouts use it. fetch_submodules() then fetches each
+    checkout's top level submodules from their mirror with a plain, non-recursive
+    'git fetch', so the checkouts' remotes are unchanged and the file protocol
+    stays blocked for submodule commands (CVE-2022-39253).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path = DEFAULT_MIRROR_CACHE_DIR,
+        ttl: float = DEFAULT_MIRROR_TTL,
+        lock_timeout: Optional[float] = DEFAULT_LOCK_TIMEOUT,
+    ):
+        self.cache_dir = Path(cache_dir).expanduser().absolute()
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+
+    def mirror_path(self, url: str) -> Path:
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", url.rstrip("/").rsplit("/", 1)[-1])
+        if name.endswith(".git"):
+            name = name[: -len(".git")]
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+
+        return self.cache_dir / f"{name}-{digest}.git"
+
+    def _git(self, *args: str, cwd: Path) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            ["git"] + list(args), cwd=cwd, capture_output=True, text=True
+        )
+
+    def _fetch(self, url: str, path: Path) -> bool:
+        configured = self._git("config", "--get", "remote.origin.url", cwd=path)
+        if configured.returncode != 0:
+            self._git("remote", "add", "--mirror=fetch", "origin", url, cwd=path)
+
+        log.info(f"Fetching mirror {url}")
+        result = self._git("fetch", "--prune", "--quiet", "origin", cwd=path)
+        if result.returncode != 0:
+            log.error(f"Failed fetching mirror {url}: {result.stderr.strip()}")
+            return False
+
+        (path / FETCHED_MARKER).touch()
+
+        return True
+
+    def refresh(self, url: str) -> Optional[Path]:
+        """Bring the mirror for `url` up to date if it is older than the TTL.
+
+        Returns the mirror path, or None if no usable mirror exists.
+        """
+        path = self.mirror_path(url)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        ## 'git init' is safe to repeat, so concurrent first runs can't conflict
+        if not path.exists():
+            init = self._git("init", "--bare", "--quiet", str(path), cwd=self.cache_dir)
+            if init.returncode != 0:
+                log.error(f"Failed creating mirror for {url}: {init.stderr.strip()}")
+                return None
+
+        try:
+            result = single_flight(
+                path,
+                FETCH_OPERATION,
+                lambda: self._fetch(url, path),
+                timeout=self.lock_timeout,
+                max_age=self.ttl,
+            )
+        except RepoLockTimeout as exc:
+            log.warning(f"Skipping mirror for {url}: {exc}")
+            return None
+        except OSError as exc:
+            ## i.e. the mirror was pruned while this run waited for its lock
+            log.warning(f"Skipping mirror for {url}, it was removed: {exc}")
+            return None
+
+        if not result.success:
+            ## A stale mirror is still usable, an empty one is not
+            refs = self._git("for-each-ref", "--count=1", cwd=path)
+            if not refs.stdout.strip():
+                return None
+
+            log.warning(f"Using stale mirror for {url}")
+
+        return path
+
+    def refresh_all(self, repo_path: str | Path) -> Dict[str, Path]:
+        """Refresh mirrors for every submodule in `repo_path`, return {url: mirror}."""
+        mirrors = {}
+        for name, url in read_gitmodules_urls(repo_path).items():
+            path = self.refresh(url)
+            if path is not None:
+                mirrors[url] = path
+            else:
+                log.warning(f"Submodule '{name}' will be fetched from {url} directly")
+
+        return mirrors
+
+    def fetch_submodules(self, repo_path: str | Path, mirrors: Dict[str, Path]) -> bool:
+        """Update remote-tracking refs of `repo_path`'s initialized submodules.
+
+        Submodules with a mirror are fetched from it, the rest from their own
+        remote. Run 'git submodule update --remote --no-fetch' afterwards.
+        Returns False if any fetch failed.
+        """
+        repo_path = Path(repo_path)
+        urls = read_gitmodules_urls(repo_path)
+        success = True
+
+        for name, sub_path in read_gitmodules_paths(repo_path).items():
+            submodule_dir = repo_path / sub_path
+            if not (submodule_dir / ".git").exists():
+                ## Not cloned yet, 'git submodule update --init' clones it
+                continue
+
+            mirror = mirrors.get(urls.get(name, ""))
+            if mirror is not None:
+                result = self._git(
+                    "fetch",
+                    "--no-recurse-submodules",
+                    "--prune",
+                    "--quiet",
+                    str(mirror),
+                    "+refs/heads/*:refs/remotes/origin/*",
+                    cwd=submodule_dir,
+                )
+                if result.returncode == 0:
+                    continue
+
+                log.warning(
+                    f"Failed fetching '{name}' from mirror, using its remote: {result.stderr.strip()}"
+                )
+
+            result = self._git(
+                "fetch", "--no-recurse-submodules", "--quiet", "origin", cwd=submodule_dir
+            )
+            if result.returncode != 0:
+                log.error(f"Failed fetching submodule '{name}': {result.stderr.strip()}")
+                success = False
+
+        return success
+
+    def list_mirrors(self) -> List[MirrorInfo]:
+        if not self.cache_dir.exists():
+            return []
+
+        mirrors = []
+        for path in sorted(self.cache_dir.glob("*.git")):
+            url = self._git("config", "--get", "remote.origin.url", cwd=path).stdout.strip()
+            size = sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+            marker = path / FETCHED_MARKER
+            mirrors.append(
+                MirrorInfo(
+                    url=url,
+                    path=path,
+                    size_bytes=size,
+                    last_fetched=marker.stat().st_mtime if marker.exists() else None,
+                )
+            )
+
+        return mirrors
+
+    def report(self) -> str:
+        mirrors = self.list_mirrors()
+        lines = [f"Mirror cache: {self.cache_dir}"]
+        for mirror in mirrors:
+            age = (
+                f"{(time.time() - mirror.last_fetched) / 3600:.1f}h ago"
+                if mirror.last_fetched is not None
+                else "never"
+            )
+            lines.append(
+                f"  {mirror.size_bytes / 1024 / 1024:>8.1f} MiB  fetched {age:<12} {mirror.url}"
+            )
+
+        total = sum(mirror.size_bytes for mirror in mirrors)
+        lines.append(f"  {total / 1024 / 1024:>8.1f} MiB  total ({len(mirrors)} mirrors)")
+
+        return "\n".join(lines)
+
+    def prune(self, max_age: float) -> List[Path]:
+        """Delete mirrors not successfully fetched in the last `max_age` seconds.
+
+        Mirrors are only fetched when an updater runs with the cache enabled, so
+        pick `max_age` well above the interval between updates. Mirrors that were
+        never fetched (i.e. a first fetch still running) and mirrors locked by a
+        running fetch are left alone.
+        """
+        removed = []
+        for mirror in self.list_mirrors():
+            if mirror.last_fetched is None or time.time() - mirror.last_fetched < max_age:
+                continue
+
+            try:
+                with RepoLock(mirror.path, timeout=0):
+                    shutil.rmtree(mirror.path)
+            except RepoLockTimeout:
+                log.info(f"Mirror {mirror.path} is in use, not pruning")
+                continue
+
+            log.info(f"Pruned mirror {mirror.url} ({mirror.size_bytes / 1024 / 1024:.1f} MiB)")
+            removed.append(mirror.path)
+
+        return removed
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+import shutil
+import subprocess
+
+import pytest
+
+if shutil.which("git") is None:
+    pytest.skip("git is not installed", allow_module_level=True)
+
+
+## Local paths as submodule urls need the file protocol, which git blocks for
+#  submodule commands by default. Only the fixture setup opts in.
+ALLOW_FILE = ("-c", "protocol.file.allow=always")
+
+
+def git(*args: str, cwd: Path | None = None) -> str:
+    result = subprocess.run(
+        ["git", *args], cwd=cwd, check=True, capture_output=True, text=True
+    )
+
+    return result.stdout.strip()
+
+
+@dataclass
+class SyntheticMothership:
+    """A Mothership bare repo whose submodules point at local bare 'upstreams'."""
+
+    root: Path
+    mothership_url: Path
+    upstreams: dict[str, Path] = field(default_factory=dict)
+
+    def clone(self, name: str) -> Path:
+        """Clone a Mothership checkout with submodules initialized."""
+        checkout = self.root / name
+        git(*ALLOW_FILE, "clone", "--quiet", "--recurse-submodules", str(self.mothership_url), str(checkout))
+
+        return checkout
+
+    def push_upstream_commit(self, name: str, message: str = "upstream change") -> str:
+        """Add a commit to a submodule's upstream, return its sha."""
+        work = self.root / f"{name}-work"
+        if not work.exists():
+            git("clone", "--quiet", str(self.upstreams[name]), str(work))
+
+        git("commit", "--quiet", "--allow-empty", "-m", message, cwd=work)
+        git("push", "--quiet", "origin", "HEAD:main", cwd=work)
+
+        return git("rev-parse", "HEAD", cwd=work)
+
+
+@pytest.fixture(autouse=True)
+def git_env(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    ## Isolate from the user's git config
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(tmp_path / "gitconfig"))
+    monkeypatch.setenv("GIT_CONFIG_COUNT", "1")
+    monkeypatch.setenv("GIT_CONFIG_KEY_0", "init.defaultBranch")
+    monkeypatch.setenv("GIT_CONFIG_VALUE_0", "main")
+    for var in ("AUTHOR", "COMMITTER"):
+        monkeypatch.setenv(f"GIT_{var}_NAME", "Mothership Tests")
+        monkeypatch.setenv(f"GIT_{var}_EMAIL", "tests@example.com")
+
+
+@pytest.fixture
+def allow_file_protocol(monkeypatch: pytest.MonkeyPatch, git_env: None) -> None:
+    """Let submodule commands fetch from the local bare 'upstreams'."""
+    monkeypatch.setenv("GIT_CONFIG_COUNT", "2")
+    monkeypatch.setenv("GIT_CONFIG_KEY_1", "protocol.file.allow")
+    monkeypatch.setenv("GIT_CONFIG_VALUE_1", "always")
+
+
+@pytest.fixture
+def synthetic_mothership(tmp_path: Path) -> SyntheticMothership:
+    """Build a Mothership with two submodules, all remotes are local bare repos."""
+    root = tmp_path / "remotes"
+    root.mkdir()
+    upstreams = {}
+
+    for name in ("dotfiles", "neovim"):
+        work = root / f"{name}-work"
+        git("init", "--quiet", str(work))
+        git("commit", "--quiet", "--allow-empty", "-m", f"{name} init", cwd=work)
+        upstreams[name] = root / f"{name}.git"
+        git("clone", "--quiet", "--bare", str(work), str(upstreams[name]))
+        git("remote", "add", "origin", str(upstreams[name]), cwd=work)
+
+    work = root / "Mothership-work"
+    git("init", "--quiet", str(work))
+    for name, url in upstreams.items():
+        git(*ALLOW_FILE, "submodule", "add", "--quiet", str(url), f"modules/{name}", cwd=work)
+    git("commit", "--quiet", "-m", "Add submodules", cwd=work)
+
+    mothership_url = root / "Mothership.git"
+    git("clone", "--quiet", "--bare", str(work), str(mothership_url))
+
+    return SyntheticMothership(root=root, mothership_url=mothership_url, upstreams=upstreams)
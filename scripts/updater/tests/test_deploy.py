@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import importlib.util
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import time
+
+from updater.libs.locks import RepoLock, RepoLockTimeout
+
+from conftest import SyntheticMothership, git
+import pytest
+
+## The deploy script is packaged on its own, load it from its path
+DEPLOY_SCRIPT = Path(__file__).resolve().parents[2] / "deploy" / "do_deployment.py"
+_spec = importlib.util.spec_from_file_location("do_deployment", DEPLOY_SCRIPT)
+do_deployment = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(do_deployment)
+
+DeployRoot = do_deployment.DeployRoot
+
+TARGETS = {"dotfiles": "~/.dotfiles", "neovim": "~/.config/nvim"}
+
+
+@pytest.fixture
+def controller(synthetic_mothership: SyntheticMothership, tmp_path: Path):
+    """A deploy controller for a Mothership checkout, deploying both submodules."""
+    mothership = synthetic_mothership.clone("Mothership")
+    config_path = tmp_path / "deploy.json"
+    config_path.write_text(
+        json.dumps(
+            {
+                "repositories": [
+                    {"name": name, "target": target, "branch": "main"}
+                    for name, target in TARGETS.items()
+                ]
+            }
+        )
+    )
+
+    return do_deployment.MothershipController(mothership, config_path, tmp_path)
+
+
+def test_resolve_home_targets(tmp_path: Path):
+    home = DeployRoot(path=tmp_path / "alice", is_home=True)
+
+    assert home.resolve("~/.config/nvim") == tmp_path / "alice" / ".config" / "nvim"
+    assert home.resolve("~") == tmp_path / "alice"
+    for target in ("/etc/nvim", "relative/nvim", "~/../bob/.config"):
+        with pytest.raises(ValueError):
+            home.resolve(target)
+
+
+def test_resolve_root_targets(tmp_path: Path):
+    root = DeployRoot(path=tmp_path / "lab01", home=Path("/home/alice"))
+
+    assert root.resolve("~/.dotfiles") == tmp_path / "lab01" / "home" / "alice" / ".dotfiles"
+    assert root.resolve("/opt/tools") == tmp_path / "lab01" / "opt" / "tools"
+    for target in ("relative/tools", "/opt/../../escape"):
+        with pytest.raises(ValueError):
+            root.resolve(target)
+
+    ## Without --root-home, '~' is the deploying user's home
+    default_home = DeployRoot(path=tmp_path / "lab01")
+    assert default_home.resolve("~/.dotfiles") == (
+        tmp_path / "lab01" / Path.home().relative_to(Path.home().anchor) / ".dotfiles"
+    )
+
+
+def test_resolve_refuses_symlinks_out_of_root(tmp_path: Path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    home_dir = tmp_path / "alice"
+    (home_dir / "dotfiles").mkdir(parents=True)
+    (home_dir / ".config").symlink_to(outside)
+    (home_dir / ".dotfiles").symlink_to(home_dir / "dotfiles")
+    (home_dir / ".dangling").symlink_to(outside / "missing")
+    home = DeployRoot(path=home_dir, is_home=True)
+
+    for target in ("~/.config/nvim", "~/.dangling/nvim"):
+        with pytest.raises(ValueError, match="symlink"):
+            home.resolve(target)
+
+    ## Symlinks that stay inside the root are fine
+    assert home.resolve("~/.dotfiles/vim") == home_dir / ".dotfiles" / "vim"
+
+
+def test_check_roots_dedupes_and_rejects_nested(controller, tmp_path: Path):
+    alice = DeployRoot(path=tmp_path / "homes" / "alice", is_home=True)
+    again = DeployRoot(path=tmp_path / "homes" / "." / "alice", is_home=True)
+    bob = DeployRoot(path=tmp_path / "homes" / "bob", is_home=True)
+
+    assert [r.path for r in controller._check_roots([alice, again, bob])] == [
+        alice.path,
+        bob.path,
+    ]
+
+    nested = DeployRoot(path=tmp_path / "homes" / "alice" / "sub", is_home=True)
+    with pytest.raises(ValueError, match="nested"):
+        controller._check_roots([DeployRoot(path=tmp_path / "homes" / "alice", is_home=True), nested])
+
+
+def test_check_roots_rejects_invalid_targets(controller, tmp_path: Path):
+    controller.deploy_order[0].target = "/etc/dotfiles"
+
+    with pytest.raises(ValueError, match="Invalid fleet targets"):
+        controller._check_roots([DeployRoot(path=tmp_path / "alice", is_home=True)])
+
+
+def test_fleet_fetches_each_upstream_once(
+    controller, synthetic_mothership: SyntheticMothership, tmp_path: Path, capsys
+):
+    new_sha = synthetic_mothership.push_upstream_commit("dotfiles")
+    homes = [tmp_path / "homes" / name for name in ("alice", "bob", "carol")]
+
+    reports = controller.deploy_fleet(
+        [DeployRoot(path=home, is_home=True) for home in homes], jobs=3
+    )
+
+    out = capsys.readouterr().out
+    for name in TARGETS:
+        assert out.count(f"Fetching {name} upstream") == 1
+    assert all(len(report.deployed_repos) == len(TARGETS) for report in reports)
+    for home in homes:
+        assert git("rev-parse", "HEAD", cwd=home / ".dotfiles") == new_sha
+        ## Roots track the upstream, not the Mothership
+        assert git("config", "--get", "remote.origin.url", cwd=home / ".dotfiles") == str(
+            synthetic_mothership.upstreams["dotfiles"]
+        )
+
+
+def _fleet_worker(controller, home: str, ready, results) -> None:
+    ready.put(os.getpid())
+    reports = controller.deploy_fleet([DeployRoot(path=Path(home), is_home=True)])
+    results.put(len(reports[0].deployed_repos))
+
+
+@pytest.mark.skipif(
+    os.name == "nt" or "fork" not in multiprocessing.get_all_start_methods(),
+    reason="forks worker processes",
+)
+def test_concurrent_fleet_deploys_share_one_fetch(
+    controller, synthetic_mothership: SyntheticMothership, tmp_path: Path, capfd
+):
+    new_sha = synthetic_mothership.push_upstream_commit("dotfiles")
+    homes = [tmp_path / "homes" / f"user{i}" for i in range(4)]
+    ctx = multiprocessing.get_context("fork")
+    ready, results = ctx.Queue(), ctx.Queue()
+
+    with do_deployment.MothershipLock(controller.mothership_dir, timeout=5):
+        procs = [
+            ctx.Process(target=_fleet_worker, args=(controller, str(home), ready, results))
+            for home in homes
+        ]
+        for proc in procs:
+            proc.start()
+        for _ in procs:
+            ready.get(timeout=30)
+        ## Let every worker queue on the lock before it's released
+        time.sleep(0.5)
+
+    deployed = [results.get(timeout=60) for _ in procs]
+    for proc in procs:
+        proc.join(timeout=30)
+        assert proc.exitcode == 0
+
+    out = capfd.readouterr().out
+    assert deployed == [len(TARGETS)] * len(homes)
+    assert "Could not fetch" not in out
+    for name in TARGETS:
+        assert out.count(f"Fetching {name} upstream") == 1
+        assert out.count(f"{name} upstream was just fetched") == len(homes) - 1
+    for home in homes:
+        assert git("rev-parse", "HEAD", cwd=home / ".dotfiles") == new_sha
+
+
+def test_deploy_and_updater_lock_same_file_in_worktree(
+    synthetic_mothership: SyntheticMothership,
+):
+    checkout = synthetic_mothership.clone("Mothership")
+    worktree = synthetic_mothership.root / "Mothership-worktree"
+    git("worktree", "add", "--quiet", "--detach", str(worktree), cwd=checkout)
+    assert (worktree / ".git").is_file()
+
+    deploy_lock = do_deployment.MothershipLock(worktree, timeout=0)
+
+    assert deploy_lock.lock_path == RepoLock(worktree).lock_path
+    with deploy_lock:
+        with pytest.raises(RepoLockTimeout):
+            RepoLock(worktree, timeout=0).acquire()
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+
+from updater.commands.git_cmd.prefab import update_git_submodules
+from updater.libs.locks import RepoLock
+from updater.services.mirror_svc import MirrorCache
+from updater.services.mirror_svc.controller import FETCHED_MARKER
+
+from conftest import SyntheticMothership, git
+import pytest
+
+@pytest.fixture
+def fetch_count(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Record the url of every mirror fetch."""
+    fetched = []
+    original = MirrorCache._fetch
+
+    def _fetch(self, url, path):
+        fetched.append(url)
+        return original(self, url, path)
+
+    monkeypatch.setattr(MirrorCache, "_fetch", _fetch)
+
+    return fetched
+
+
+def test_checkouts_share_one_fetch_within_ttl(
+    synthetic_mothership: SyntheticMothership, tmp_path: Path, fetch_count: list[str]
+):
+    cache = MirrorCache(tmp_path / "cache", ttl=3600)
+    first = synthetic_mothership.clone("first")
+    second = synthetic_mothership.clone("second")
+    new_sha = synthetic_mothership.push_upstream_commit("dotfiles")
+
+    assert update_git_submodules(repo_path=first, mirror_cache=cache) is True
+    assert update_git_submodules(repo_path=second, mirror_cache=cache) is True
+
+    assert sorted(fetch_count) == sorted(str(u) for u in synthetic_mothership.upstreams.values())
+    for checkout in (first, second):
+        assert git("rev-parse", "HEAD", cwd=checkout / "modules" / "dotfiles") == new_sha
+        ## Remotes are not rewritten to point at the cache
+        assert git(
+            "config", "--get", "remote.origin.url", cwd=checkout / "modules" / "dotfiles"
+        ) == str(synthetic_mothership.upstreams["dotfiles"])
+
+
+def test_stale_mirror_used_when_upstream_missing(
+    synthetic_mothership: SyntheticMothership, tmp_path: Path
+):
+    cache = MirrorCache(tmp_path / "cache", ttl=0)
+    upstream = str(synthetic_mothership.upstreams["dotfiles"])
+    checkout = synthetic_mothership.clone("checkout")
+    new_sha = synthetic_mothership.push_upstream_commit("dotfiles")
+    mirror = cache.refresh(upstream)
+    fetched_at = cache.list_mirrors()[0].last_fetched
+
+    os.rename(upstream, f"{upstream}.gone")
+    time.sleep(0.05)
+
+    assert cache.refresh(upstream) == mirror
+    assert git("rev-parse", "refs/heads/main", cwd=mirror) == new_sha
+    ## A failed fetch doesn't count as fetched
+    assert cache.list_mirrors()[0].last_fetched == fetched_at
+
+    ## The checkout still updates through the mirror
+    assert update_git_submodules(repo_path=checkout, mirror_cache=cache) is True
+    assert git("rev-parse", "HEAD", cwd=checkout / "modules" / "dotfiles") == new_sha
+
+
+def test_empty_mirror_falls_back_to_upstream(tmp_path: Path):
+    cache = MirrorCache(tmp_path / "cache")
+
+    assert cache.refresh(str(tmp_path / "does-not-exist.git")) is None
+
+
+def test_prune_during_refresh_falls_back_to_upstream(
+    synthetic_mothership: SyntheticMothership, tmp_path: Path
+):
+    cache = MirrorCache(tmp_path / "cache")
+    upstream = str(synthetic_mothership.upstreams["dotfiles"])
+    mirror = cache.refresh(upstream)
+    refreshed = {}
+
+    ## Remove the mirror while another refresh waits for its lock
+    lock = RepoLock(mirror).acquire()
+    waiter = threading.Thread(target=lambda: refreshed.update(path=cache.refresh(upstream)))
+    waiter.start()
+    time.sleep(0.5)
+    shutil.rmtree(mirror)
+    lock.release()
+    waiter.join(timeout=30)
+
+    assert refreshed == {"path": None}
+    ## The next run recreates it
+    assert cache.refresh(upstream) == mirror
+
+
+def test_fetch_submodules_uses_mirror_refs(
+    synthetic_mothership: SyntheticMothership, tmp_path: Path
+):
+    cache = MirrorCache(tmp_path / "cache")
+    checkout = synthetic_mothership.clone("checkout")
+    mirrors = cache.refresh_all(checkout)
+
+    assert cache.fetch_submodules(checkout, mirrors) is True
+    for name in synthetic_mothership.upstreams:
+        tracking = git("rev-parse", "refs/remotes/origin/main", cwd=checkout / "modules" / name)
+        assert tracking == git("rev-parse", "refs/heads/main", cwd=mirrors[str(synthetic_mothership.upstreams[name])])
+
+
+def test_report_and_prune(synthetic_mothership: SyntheticMothership, tmp_path: Path):
+    cache = MirrorCache(tmp_path / "cache")
+    old = cache.refresh(str(synthetic_mothership.upstreams["dotfiles"]))
+    locked = cache.refresh(str(synthetic_mothership.upstreams["neovim"]))
+    never_fetched = cache.mirror_path("https://example.com/never-fetched.git")
+    git("init", "--quiet", "--bare", str(never_fetched))
+
+    week_ago = time.time() - 7 * 24 * 60 * 60
+    for mirror in (old, locked):
+        os.utime(mirror / FETCHED_MARKER, (week_ago, week_ago))
+
+    report = cache.report()
+    assert "3 mirrors" in report
+    assert "never" in report
+
+    with RepoLock(locked):
+        removed = cache.prune(24 * 60 * 60)
+
+    assert removed == [old]
+    assert not old.exists()
+    assert locked.exists()
+    assert never_fetched.exists()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+from pathlib import Path
+import time
+
+from updater.commands.git_cmd.prefab import update_git_submodules
+from updater.libs.locks import RepoLock, RepoLockTimeout, single_flight
+from updater.services.shell_svc import ShellCommandRunner
+
+from conftest import SyntheticMothership, git
+import pytest
+
+if os.name == "nt" or "fork" not in multiprocessing.get_all_start_methods():
+    pytest.skip("concurrency tests fork worker processes", allow_module_level=True)
+
+## Updates without a mirror cache fetch straight from the local 'upstreams'
+pytestmark = pytest.mark.usefixtures("allow_file_protocol")
+
+WORKERS = 8
+
+
+class RecordingRunner(ShellCommandRunner):
+    """Runner that appends every command it runs to a file, one per line."""
+
+    def __init__(self, calls_file: str):
+        super().__init__(log_level="WARNING")
+        self.calls_file = calls_file
+
+    def run(self, command, cwd=None) -> int:
+        with open(self.calls_file, "a") as f:
+            f.write(" ".join(command) + "\n")
+
+        return super().run(command, cwd=cwd)
+
+
+def _update_worker(checkout: str, calls_file: str, ready, results) -> None:
+    ready.put(os.getpid())
+    success = update_git_submodules(
+        runner=RecordingRunner(calls_file), repo_path=checkout, lock_timeout=60
+    )
+    results.put(success)
+
+
+def _single_flight_worker(checkout: str, ready, results) -> None:
+    ready.put(os.getpid())
+    result = single_flight(checkout, "test-op", lambda: True, timeout=60)
+    results.put(result.reused)
+
+
+def _run_concurrently(checkout: Path, target, *args) -> list:
+    """Start WORKERS processes while holding the repo lock, release once all wait."""
+    ctx = multiprocessing.get_context("fork")
+    ready, results = ctx.Queue(), ctx.Queue()
+
+    with RepoLock(checkout, timeout=5):
+        procs = [
+            ctx.Process(target=target, args=(str(checkout), *args, ready, results))
+            for _ in range(WORKERS)
+        ]
+        for proc in procs:
+            proc.start()
+        for _ in procs:
+            ready.get(timeout=30)
+        ## Let every worker reach the lock before it's released
+        time.sleep(0.5)
+
+    outcomes = [results.get(timeout=60) for _ in procs]
+    for proc in procs:
+        proc.join(timeout=30)
+        assert proc.exitcode == 0
+
+    return outcomes
+
+
+def test_concurrent_updates_run_once(
+    synthetic_mothership: SyntheticMothership, tmp_path: Path
+):
+    checkout = synthetic_mothership.clone("Mothership")
+    new_sha = synthetic_mothership.push_upstream_commit("dotfiles")
+    calls_file = tmp_path / "calls.txt"
+
+    outcomes = _run_concurrently(checkout, _update_worker, str(calls_file))
+
+    assert outcomes == [True] * WORKERS
+    calls = calls_file.read_text().splitlines()
+    assert sum("pull" in call for call in calls) == 1
+    assert sum("submodule update" in call for call in calls) == 1
+    assert git("rev-parse", "HEAD", cwd=checkout / "modules" / "dotfiles") == new_sha
+
+
+def test_concurrent_single_flight_reuses_result(
+    synthetic_mothership: SyntheticMothership,
+):
+    checkout = synthetic_mothership.clone("Mothership")
+
+    reused = _run_concurrently(checkout, _single_flight_worker)
+
+    assert sorted(reused) == [False] + [True] * (WORKERS - 1)
+
+
+def test_single_flight_runs_again_after_finish(
+    synthetic_mothership: SyntheticMothership,
+):
+    checkout = synthetic_mothership.clone("Mothership")
+    calls = []
+
+    first = single_flight(checkout, "test-op", lambda: calls.append(1) or True)
+    second = single_flight(checkout, "test-op", lambda: calls.append(2) or True)
+    cached = single_flight(checkout, "test-op", lambda: calls.append(3) or True, max_age=60)
+
+    assert calls == [1, 2]
+    assert not first.reused and not second.reused
+    assert cached.reused and cached.success
+
+
+def test_lock_timeout(synthetic_mothership: SyntheticMothership):
+    checkout = synthetic_mothership.clone("Mothership")
+
+    with RepoLock(checkout):
+        start = time.monotonic()
+        with pytest.raises(RepoLockTimeout):
+            RepoLock(checkout, timeout=0.3).acquire()
+        assert time.monotonic() - start < 5
+
+        assert update_git_submodules(repo_path=checkout, lock_timeout=0.3) is False
+
+
+def test_shared_locks_do_not_block_each_other(
+    synthetic_mothership: SyntheticMothership,
+):
+    checkout = synthetic_mothership.clone("Mothership")
+
+    with RepoLock(checkout, shared=True), RepoLock(checkout, shared=True, timeout=0):
+        with pytest.raises(RepoLockTimeout):
+            RepoLock(checkout, timeout=0).acquire()
+
+
+def test_update_from_subdirectory_locks_repo_root(
+    synthetic_mothership: SyntheticMothership,
+):
+    checkout = synthetic_mothership.clone("Mothership")
+
+    assert update_git_submodules(repo_path=checkout / "modules") is True
+    assert (checkout / ".git" / "mothership.lock").exists()